@@ -7,13 +7,15 @@ This script:
 - Generates id as slug(name)-slug(city)
 - Validates enums (industry, remote_policy, province)
 - Dedupes against existing companies.csv
+- Warns about near-duplicate names (typos) of existing companies
 - Geocodes city, province, Canada → lat/lng
 - Caches geocoding results locally
 
 Usage:
-    python scripts/add_companies.py [--check] [--input data/incoming.csv]
+    python scripts/add_companies.py [--check] [--strict] [--input data/incoming.csv]
     
     --check: Validate only, don't write to companies.csv
+    --strict: Treat near-duplicate name warnings as errors
     --input: Path to input CSV (default: data/incoming.csv or stdin)
 """
 
@@ -23,80 +25,148 @@ import os
 import json
 import re
 import argparse
-from urllib.parse import urlparse
-from typing import Dict, List, Optional, Tuple
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
+from typing import Dict, List, Optional, Set, Tuple
 from pathlib import Path
 
 try:
     from geopy.geocoders import Nominatim
     from geopy.exc import GeocoderTimedOut, GeocoderServiceError
+    from geopy.extra.rate_limiter import RateLimiter
 except ImportError:
     print("Error: geopy is required. Install with: pip install geopy")
     sys.exit(1)
 
+# Optional: orjson makes geocode cache (de)serialization much faster
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from rapidfuzz import fuzz, process as fuzz_process
+except ImportError:
+    print("Error: rapidfuzz is required. Install with: pip install rapidfuzz")
+    sys.exit(1)
+
 # Constants
 CSV_PATH = 'companies.csv'
 CACHE_PATH = 'data/geocode_cache.json'
-INDUSTRIES = {
+READ_BUFFER_SIZE = 1 << 20  # 1 MiB read buffer for CSV input
+# Concurrent geocoding lookups. Public Nominatim allows 1 request/second, so
+# keep this at 1 unless pointing at a self-hosted instance.
+GEOCODE_WORKERS = 1
+# Minimum rapidfuzz ratio (0-100) for a name to count as a near-duplicate
+FUZZY_MATCH_CUTOFF = 90
+INDUSTRIES = frozenset({
     'SaaS', 'Fintech', 'Healthtech', 'Ecommerce', 'Agency', 
     'Gaming', 'AI', 'Cleantech', 'Telecommunications'
-}
-REMOTE_POLICIES = {'Remote', 'Hybrid', 'Onsite'}
-PROVINCES = {
+})
+REMOTE_POLICIES = frozenset({'Remote', 'Hybrid', 'Onsite'})
+PROVINCES = frozenset({
     'AB', 'BC', 'MB', 'NB', 'NL', 'NS', 'NT', 'NU', 'ON', 
     'PE', 'QC', 'SK', 'YT'
-}
+})
+# Lookup tables for case-insensitive enum validation: field -> ({casefolded: canonical}, display)
+_ENUM_FIELDS = [
+    (field, {v.casefold(): v for v in values}, ', '.join(sorted(values)))
+    for field, values in (('industry', INDUSTRIES), ('remote_policy', REMOTE_POLICIES), ('province', PROVINCES))
+]
+# Trailing corporate suffixes (e.g. " Inc.", " Ltd", " Corp") ignored when deduplicating
+_NAME_SUFFIX_RE = re.compile(r'(?:\s+(?:inc\.?|ltd\.?|corp\.?|llc|co\.?))+$')
+# Leading URL scheme replaced by normalize_url
+_HTTP_PREFIX_RE = re.compile(r'^https?://', re.IGNORECASE)
+# Normalized URL: https:// + optional userinfo + host, optional port, optional path/query/fragment
+_URL_RE = re.compile(r'^https://(?:[^@/?#\s]+@)?([^@/?#:\s]+)(?::\d+)?(?:[/?#].*)?$')
+# ASCII hostname; internationalized hosts are checked after IDNA encoding
+_HOSTNAME_RE = re.compile(r'^[A-Za-z0-9](?:[A-Za-z0-9.-]*[A-Za-z0-9])?$')
+# Slug helpers: characters other than word chars, whitespace and hyphens are dropped
+_SLUG_STRIP_RE = re.compile(r'[^\w\s-]')
+_SLUG_DASH_RE = re.compile(r'[-\s]+')
+_SLUG_ASCII_DELETE = str.maketrans('', '', ''.join(
+    c for c in map(chr, range(128)) if not (c.isalnum() or c.isspace() or c in '_-')
+))
 
-# Geocoder instance (lazy-loaded)
-_geocoder = None
+# Rate-limited geocode function (lazy-loaded)
+_geocode = None
 
 def get_geocoder():
-    """Get or create geocoder instance."""
-    global _geocoder
-    if _geocoder is None:
-        _geocoder = Nominatim(user_agent="canada-tech-repo")
-    return _geocoder
+    """
+    Get or create the geocode function.
+    Wraps Nominatim in a RateLimiter to respect its 1 request/second policy
+    and retry transient errors. A single geocoder instance is reused so its
+    HTTP session (and keep-alive connection) is shared across lookups.
+    """
+    global _geocode
+    if _geocode is None:
+        geocoder = Nominatim(user_agent="canada-tech-repo")
+        _geocode = RateLimiter(
+            geocoder.geocode,
+            min_delay_seconds=1.0,
+            max_retries=2,
+            error_wait_seconds=5.0,
+            swallow_exceptions=False,
+        )
+    return _geocode
 
-def load_cache() -> Dict[str, Dict[str, float]]:
-    """Load geocoding cache from JSON file."""
-    if os.path.exists(CACHE_PATH):
-        try:
-            with open(CACHE_PATH, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            return {}
-    return {}
+def load_cache() -> Tuple[Dict[str, Dict[str, float]], bool]:
+    """
+    Load geocoding cache from JSON file.
+    Returns (cache, migrated) tuple; migrated is True if legacy keys were
+    rewritten in memory and the cache should be saved.
+    """
+    try:
+        with open(CACHE_PATH, 'rb') as f:
+            data = f.read()
+        cache = orjson.loads(data) if orjson else json.loads(data)
+    except (json.JSONDecodeError, IOError):
+        # Missing or unreadable cache: start fresh
+        return {}, False
+    
+    # Migrate legacy "City, PROV, Canada" keys to geocode_cache_key() format
+    legacy_keys = [key for key in cache if key.endswith(', Canada')]
+    for key in legacy_keys:
+        city, _, province = key[:-len(', Canada')].rpartition(', ')
+        cache.setdefault(geocode_cache_key(city, province), cache.pop(key))
+    
+    return cache, bool(legacy_keys)
 
 def save_cache(cache: Dict[str, Dict[str, float]]):
-    """Save geocoding cache to JSON file."""
+    """
+    Save geocoding cache to JSON file.
+    Writes to a temp file in the same directory, fsyncs it, then renames it
+    over the cache so an interrupted save never leaves a truncated cache.
+    """
     os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
-    with open(CACHE_PATH, 'w', encoding='utf-8') as f:
-        json.dump(cache, f, indent=2)
+    tmp_path = CACHE_PATH + '.tmp'
+    data = orjson.dumps(cache) if orjson else json.dumps(cache).encode('utf-8')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, CACHE_PATH)
 
 def normalize_url(url: str) -> str:
     """Normalize URL: force https://, strip trailing slashes."""
-    url = url.strip()
-    if not url:
-        return url
-    
-    # Add https:// if missing
-    if not url.startswith(('http://', 'https://')):
-        url = 'https://' + url
-    elif url.startswith('http://'):
-        url = url.replace('http://', 'https://', 1)
-    
-    # Strip trailing slash
-    url = url.rstrip('/')
-    
-    return url
+    # Drop any http:// or https:// prefix, then add https:// back
+    url = _HTTP_PREFIX_RE.sub('', url.strip())
+    return 'https://' + url.rstrip('/') if url else url
 
+@lru_cache(maxsize=2048)
 def slugify(text: str) -> str:
     """Convert text to URL-friendly slug."""
     # Convert to lowercase
     text = text.lower()
-    # Replace spaces and special chars with hyphens
-    text = re.sub(r'[^\w\s-]', '', text)
-    text = re.sub(r'[-\s]+', '-', text)
+    # Remove special chars (translate is much cheaper than a regex for ASCII text)
+    if text.isascii():
+        text = text.translate(_SLUG_ASCII_DELETE)
+    else:
+        text = _SLUG_STRIP_RE.sub('', text)
+    # Replace runs of spaces and hyphens with a single hyphen
+    text = _SLUG_DASH_RE.sub('-', text)
     # Remove leading/trailing hyphens
     text = text.strip('-')
     return text
@@ -107,34 +177,42 @@ def generate_id(name: str, city: str) -> str:
     city_slug = slugify(city)
     return f"{name_slug}-{city_slug}"
 
-def geocode_location(city: str, province: str, hq_address: Optional[str] = None) -> Tuple[float, float]:
+def geocode_cache_key(city: str, province: str) -> str:
+    """
+    Build the geocoding cache key for a city.
+    The city is slugified so spelling variants like "Toronto", "toronto "
+    and "TORONTO" share one cache entry (and one API call).
+    """
+    return f"{slugify(city)}|{province.strip().upper()}"
+
+def geocode_location(city: str, province: str, hq_address: Optional[str],
+                     cache: Dict[str, Dict[str, float]]) -> Tuple[float, float]:
     """
     Geocode city, province, Canada to lat/lng.
-    Uses cache to avoid repeated API calls.
+    Uses (and updates) the given cache dict to avoid repeated API calls;
+    the caller is responsible for persisting it with save_cache().
     Returns (lat, lng) tuple.
     Raises ValueError if geocoding fails.
     """
-    cache = load_cache()
-    
     # Build query
     query_parts = []
     if hq_address:
         query_parts.append(hq_address)
-    query_parts.append(city)
-    query_parts.append(province)
+    query_parts.append(city.strip())
+    query_parts.append(province.strip().upper())
     query_parts.append('Canada')
     query = ', '.join(query_parts)
     
     # Check cache
-    cache_key = f"{city}, {province}, Canada"
+    cache_key = geocode_cache_key(city, province)
     if cache_key in cache:
         cached = cache[cache_key]
         return cached['lat'], cached['lng']
     
     # Geocode
     try:
-        geocoder = get_geocoder()
-        location = geocoder.geocode(query, timeout=10)
+        geocode = get_geocoder()
+        location = geocode(query, timeout=10)
         
         if location is None:
             raise ValueError(f"Geocoding failed for: {query}")
@@ -143,7 +221,6 @@ def geocode_location(city: str, province: str, hq_address: Optional[str] = None)
         
         # Cache result
         cache[cache_key] = {'lat': lat, 'lng': lng}
-        save_cache(cache)
         
         return lat, lng
         
@@ -152,58 +229,106 @@ def geocode_location(city: str, province: str, hq_address: Optional[str] = None)
 
 def load_existing_companies() -> List[Dict[str, str]]:
     """Load existing companies from companies.csv."""
-    if not os.path.exists(CSV_PATH):
+    try:
+        f = open(CSV_PATH, 'r', encoding='utf-8', newline='', buffering=READ_BUFFER_SIZE)
+    except FileNotFoundError:
         return []
     
-    companies = []
-    with open(CSV_PATH, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            companies.append(row)
+    with f:
+        return list(csv.DictReader(f))
+
+def is_sorted_companies(companies: List[Dict[str, str]]) -> bool:
+    """Check whether companies are sorted by (province, name)."""
+    keys = [(c['province'], c['name']) for c in companies]
+    return all(a <= b for a, b in zip(keys, keys[1:]))
+
+def can_append_companies(existing_companies: List[Dict[str, str]],
+                         new_companies: List[Dict[str, str]],
+                         fieldnames: List[str]) -> bool:
+    """
+    Check whether sorted new_companies can be appended to companies.csv
+    instead of rewriting it. existing_companies must already be sorted by
+    (province, name); additionally requires the expected header, a trailing
+    newline, and every new row to sort strictly after the last existing row.
+    """
+    if not existing_companies or not new_companies:
+        return False
+    if list(existing_companies[0].keys()) != fieldnames:
+        return False
+    
+    last = existing_companies[-1]
+    if (new_companies[0]['province'], new_companies[0]['name']) <= (last['province'], last['name']):
+        return False
     
-    return companies
+    with open(CSV_PATH, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
 
+@lru_cache(maxsize=4096)
 def normalize_name(name: str) -> str:
     """Normalize company name for deduplication."""
-    # Lowercase, strip, remove common suffixes
-    name = name.strip().lower()
-    # Remove common corporate suffixes for comparison
-    suffixes = [' inc.', ' inc', ' ltd.', ' ltd', ' corp.', ' corp', ' llc', ' co.', ' co']
-    for suffix in suffixes:
-        if name.endswith(suffix):
-            name = name[:-len(suffix)].strip()
-    return name
+    # Lowercase, strip, remove common corporate suffixes for comparison
+    return _NAME_SUFFIX_RE.sub('', name.strip().lower()).strip()
+
+def dedup_key(company: Dict[str, str]) -> Tuple[str, str, str]:
+    """Return the (normalized name, city, province) key used for deduplication."""
+    return (
+        normalize_name(company.get('name', '')),
+        company.get('city', '').strip().lower(),
+        company.get('province', '').strip().upper(),
+    )
 
-def is_duplicate(new_company: Dict[str, str], existing_companies: List[Dict[str, str]]) -> bool:
+def build_dedup_index(companies: List[Dict[str, str]]) -> Tuple[Set[str], Set[Tuple[str, str, str]]]:
+    """Build (id_set, key_set) for O(1) duplicate checks against companies."""
+    id_set = {c['id'] for c in companies if c.get('id')}
+    key_set = {dedup_key(c) for c in companies}
+    return id_set, key_set
+
+def is_duplicate(new_company: Dict[str, str], id_set: Set[str], key_set: Set[Tuple[str, str, str]]) -> bool:
     """
     Check if company is duplicate based on:
     - Same id, OR
     - Same normalized name + city + province
     """
-    new_id = new_company['id']
-    new_name_norm = normalize_name(new_company['name'])
-    new_city = new_company['city'].strip().lower()
-    new_province = new_company['province'].strip().upper()
-    
-    for existing in existing_companies:
-        # Check ID match
-        if existing.get('id') == new_id:
-            return True
-        
-        # Check name + city + province match
-        existing_name_norm = normalize_name(existing.get('name', ''))
-        existing_city = existing.get('city', '').strip().lower()
-        existing_province = existing.get('province', '').strip().upper()
-        
-        if (existing_name_norm == new_name_norm and 
-            existing_city == new_city and 
-            existing_province == new_province):
-            return True
+    return new_company['id'] in id_set or dedup_key(new_company) in key_set
+
+def find_similar_name(name: str, existing_names: List[str]) -> Optional[int]:
+    """
+    Find the existing normalized name most similar to name.
+    Returns its index in existing_names, or None if nothing scores at least
+    FUZZY_MATCH_CUTOFF. Identical names are skipped: exact duplicates are
+    handled by is_duplicate(), and the same company in another city is allowed.
+    """
+    if not existing_names:
+        return None
+    name = normalize_name(name)
     
-    return False
+    # Plain ratio rather than token_set_ratio, which scores any token subset
+    # ("clio" vs "clio labs") as a perfect match
+    best_idx, best_score = None, 0.0
+    for choice, score, idx in fuzz_process.extract_iter(
+        name, existing_names, scorer=fuzz.ratio, score_cutoff=FUZZY_MATCH_CUTOFF
+    ):
+        if choice != name and score > best_score:
+            best_idx, best_score = idx, score
+    return best_idx
+
+def is_valid_url(url: str) -> bool:
+    """Check a normalized URL: https scheme and a valid (possibly internationalized) hostname."""
+    match = _URL_RE.match(url)
+    if not match:
+        return False
+    try:
+        host = match.group(1).encode('idna').decode('ascii')
+    except UnicodeError:
+        return False
+    return bool(_HOSTNAME_RE.match(host))
 
 def validate_company(company: Dict[str, str]) -> List[str]:
-    """Validate a company record. Returns list of errors (empty if valid)."""
+    """
+    Validate a company record. Returns list of errors (empty if valid).
+    Also normalizes the record's url and enum fields in place.
+    """
     errors = []
     
     # Required fields
@@ -212,61 +337,54 @@ def validate_company(company: Dict[str, str]) -> List[str]:
         if not company.get(field) or not company[field].strip():
             errors.append(f"Missing required field: {field}")
     
-    # URL validation
+    # URL validation (the normalized URL is stored back on the row)
     if company.get('url'):
         url = normalize_url(company['url'])
-        if not url.startswith('https://'):
-            errors.append(f"URL must start with https://: {company['url']}")
-        try:
-            parsed = urlparse(url)
-            if not parsed.netloc:
-                errors.append(f"Invalid URL format: {company['url']}")
-        except Exception as e:
-            errors.append(f"Invalid URL: {company['url']} ({e})")
-    
-    # Industry enum validation
-    if company.get('industry'):
-        industry = company['industry'].strip()
-        if industry not in INDUSTRIES:
-            errors.append(f"Invalid industry '{industry}'. Must be one of: {', '.join(sorted(INDUSTRIES))}")
-    
-    # Remote policy enum validation
-    if company.get('remote_policy'):
-        policy = company['remote_policy'].strip()
-        if policy not in REMOTE_POLICIES:
-            errors.append(f"Invalid remote_policy '{policy}'. Must be one of: {', '.join(sorted(REMOTE_POLICIES))}")
+        if not is_valid_url(url):
+            errors.append(f"Invalid URL format: {company['url']}")
+        company['url'] = url
     
-    # Province enum validation
-    if company.get('province'):
-        province = company['province'].strip().upper()
-        if province not in PROVINCES:
-            errors.append(f"Invalid province '{province}'. Must be one of: {', '.join(sorted(PROVINCES))}")
+    # Enum validation (case-insensitive; values are canonicalized in place)
+    for field, canonical, display in _ENUM_FIELDS:
+        if company.get(field):
+            value = canonical.get(company[field].strip().casefold())
+            if value is None:
+                errors.append(f"Invalid {field} '{company[field].strip()}'. Must be one of: {display}")
+            else:
+                company[field] = value
     
     return errors
 
-def process_incoming_companies(input_path: Optional[str] = None, check_only: bool = False) -> Tuple[List[Dict[str, str]], List[str]]:
+def process_incoming_companies(input_path: Optional[str] = None, check_only: bool = False,
+                               strict: bool = False) -> Tuple[List[Dict[str, str]], List[str], List[str]]:
     """
     Process incoming companies from CSV file or stdin.
-    Returns (processed_companies, errors) tuple.
+    Returns (processed_companies, errors, warnings) tuple.
+    With strict=True, near-duplicate name warnings are reported as errors.
     """
     errors = []
+    warnings = []
     incoming_companies = []
     reading_from_file = False
     
     # Read input
     if input_path:
-        if not os.path.exists(input_path):
+        try:
+            input_file = open(input_path, 'r', encoding='utf-8', newline='', buffering=READ_BUFFER_SIZE)
+        except FileNotFoundError:
             errors.append(f"Input file not found: {input_path}")
-            return [], errors
-        input_file = open(input_path, 'r', encoding='utf-8')
+            return [], errors, warnings
         reading_from_file = True
     else:
         # Try data/incoming.csv, fallback to stdin
-        if os.path.exists('data/incoming.csv'):
-            input_file = open('data/incoming.csv', 'r', encoding='utf-8')
+        try:
+            input_file = open('data/incoming.csv', 'r', encoding='utf-8', newline='', buffering=READ_BUFFER_SIZE)
             reading_from_file = True
-        else:
-            input_file = sys.stdin
+        except FileNotFoundError:
+            # Reopen stdin's descriptor with a large buffer so piped input isn't
+            # read in small chunks; closefd=False leaves sys.stdin itself open
+            input_file = open(sys.stdin.fileno(), 'r', encoding='utf-8', newline='',
+                              buffering=READ_BUFFER_SIZE, closefd=False)
             reading_from_file = False
     
     try:
@@ -282,20 +400,26 @@ def process_incoming_companies(input_path: Optional[str] = None, check_only: boo
             
             incoming_companies.append(row)
     finally:
-        if input_file != sys.stdin:
-            input_file.close()
+        input_file.close()
     
     # If reading from a file and no companies found, that's okay (empty file)
     # But if reading from stdin and no companies found, that's an error
     if not incoming_companies and not reading_from_file:
         errors.append("No companies found in input")
-        return [], errors
+        return [], errors, warnings
     
-    # Load existing companies
+    # Load existing companies and index them for duplicate checks
     existing_companies = load_existing_companies()
+    existing_ids, existing_keys = build_dedup_index(existing_companies)
+    batch_ids, batch_keys = set(), set()
+    existing_names = [normalize_name(c.get('name') or '') for c in existing_companies]
     
-    # Process each company
-    processed = []
+    # Load geocoding cache once; it is flushed after the loop if it changed
+    cache, cache_migrated = load_cache()
+    cache_size = len(cache)
+    
+    # Pass 1: validate, generate ids and dedupe against existing companies (no network I/O)
+    candidates = []
     for idx, company in enumerate(incoming_companies):
         # Validate
         validation_errors = validate_company(company)
@@ -303,68 +427,114 @@ def process_incoming_companies(input_path: Optional[str] = None, check_only: boo
             errors.extend([f"Row {idx + 2}: {e}" for e in validation_errors])
             continue
         
-        # Normalize URL
-        company['url'] = normalize_url(company['url'])
-        
         # Generate ID
         company['id'] = generate_id(company['name'], company['city'])
         
-        # Normalize province to uppercase
-        company['province'] = company['province'].strip().upper()
-        
         # Check for duplicates against existing companies
-        if is_duplicate(company, existing_companies):
+        if is_duplicate(company, existing_ids, existing_keys):
             errors.append(f"Duplicate company: {company['name']} in {company['city']}, {company['province']} (id: {company['id']})")
             continue
         
+        # Flag likely typo-duplicates of existing companies
+        match_idx = find_similar_name(company['name'], existing_names)
+        if match_idx is not None:
+            match = existing_companies[match_idx]
+            message = (f"Possible duplicate of {match['name']} in {match['city']}, {match['province']}: "
+                       f"{company['name']} in {company['city']}, {company['province']}")
+            if strict:
+                errors.append(message)
+                continue
+            warnings.append(message)
+        
+        # Set optional fields with defaults
+        company['description'] = company.get('description', '').strip()
+        company['tags'] = company.get('tags', '').strip()
+        
+        candidates.append(company)
+    
+    # Pass 2: look up each distinct uncached location once in the
+    # (rate-limited) worker pool; cache hits are resolved below without it
+    with ThreadPoolExecutor(max_workers=GEOCODE_WORKERS) as executor:
+        futures = {}
+        for company in candidates:
+            key = geocode_cache_key(company['city'], company['province'])
+            if key not in cache and key not in futures:
+                hq_address = company.get('hq_address', '').strip() or None
+                futures[key] = executor.submit(
+                    geocode_location, company['city'], company['province'], hq_address, cache
+                )
+    
+    # Pass 3: dedupe within the batch (against rows that geocoded successfully)
+    # and annotate coordinates
+    processed = []
+    for company in candidates:
         # Check for duplicates within the same batch
-        if is_duplicate(company, processed):
+        if is_duplicate(company, batch_ids, batch_keys):
             errors.append(f"Duplicate company in batch: {company['name']} in {company['city']}, {company['province']} (id: {company['id']})")
             continue
         
         # Geocode
+        key = geocode_cache_key(company['city'], company['province'])
         try:
-            hq_address = company.get('hq_address', '').strip() or None
-            lat, lng = geocode_location(company['city'], company['province'], hq_address)
+            if key in futures:
+                lat, lng = futures[key].result()
+            else:
+                cached = cache[key]
+                lat, lng = cached['lat'], cached['lng']
             company['lat'] = str(lat)
             company['lng'] = str(lng)
         except ValueError as e:
             errors.append(f"Geocoding failed for {company['name']} ({company['city']}, {company['province']}): {e}")
             continue
         
-        # Set optional fields with defaults
-        company['description'] = company.get('description', '').strip()
-        company['tags'] = company.get('tags', '').strip()
-        
         processed.append(company)
+        batch_ids.add(company['id'])
+        batch_keys.add(dedup_key(company))
+    
+    # Persist newly geocoded locations (even in check mode, so reruns are free);
+    # a cache that only had its keys migrated is rewritten on real runs only
+    if len(cache) != cache_size or (cache_migrated and not check_only):
+        save_cache(cache)
     
     # If check_only, don't write
     if check_only:
-        return processed, errors
+        return processed, errors, warnings
     
     # If there are errors, don't write anything
     if errors:
-        return processed, errors
+        return processed, errors, warnings
     
     # Append to companies.csv
     if processed:
         # Read existing to get all columns
         fieldnames = ['id', 'name', 'url', 'description', 'industry', 'tags', 'remote_policy', 'city', 'province', 'lat', 'lng']
         
-        # Load all existing companies
-        all_companies = existing_companies + processed
+        sort_key = itemgetter('province', 'name')
+        new_companies = sorted(processed, key=sort_key)
         
-        # Sort by province then name
-        all_companies.sort(key=lambda x: (x.get('province', ''), x.get('name', '')))
+        existing_sorted = is_sorted_companies(existing_companies)
         
-        # Write back
-        with open(CSV_PATH, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            for company in all_companies:
-                writer.writerow({k: company.get(k, '') for k in fieldnames})
+        if existing_sorted and can_append_companies(existing_companies, new_companies, fieldnames):
+            # Fast path: new rows all sort after the existing ones, so append them
+            with open(CSV_PATH, 'a', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames, restval='', extrasaction='ignore')
+                writer.writerows(new_companies)
+        else:
+            # Sort by province then name: companies.csv is normally already
+            # sorted (it's this script's output), so merge the sorted batch in
+            # linearly; fall back to a full sort if it was edited out of order
+            if existing_sorted:
+                all_companies = list(heapq.merge(existing_companies, new_companies, key=sort_key))
+            else:
+                all_companies = sorted(existing_companies + new_companies, key=sort_key)
+            
+            # Write back (missing columns default to '', extra input columns are dropped)
+            with open(CSV_PATH, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames, restval='', extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(all_companies)
     
-    return processed, errors
+    return processed, errors, warnings
 
 def main():
     parser = argparse.ArgumentParser(
@@ -377,6 +547,11 @@ def main():
         action='store_true',
         help='Validate only, do not write to companies.csv'
     )
+    parser.add_argument(
+        '--strict',
+        action='store_true',
+        help='Treat near-duplicate name warnings as errors'
+    )
     parser.add_argument(
         '--input',
         type=str,
@@ -385,7 +560,12 @@ def main():
     
     args = parser.parse_args()
     
-    processed, errors = process_incoming_companies(args.input, check_only=args.check)
+    processed, errors, warnings = process_incoming_companies(args.input, check_only=args.check, strict=args.strict)
+    
+    if warnings:
+        print("Warnings:", file=sys.stderr)
+        for warning in warnings:
+            print(f"  - {warning}", file=sys.stderr)
     
     if errors:
         print("Errors found:", file=sys.stderr)
@@ -18,7 +18,7 @@ def generate_readme():
     # Sort companies by province then name
     companies.sort(key=lambda x: (x['province'], x['name']))
 
-    markdown_content = """# Canada Tech 🇨🇦
+    header = """# Canada Tech 🇨🇦
 
 A crowd-sourced repository of tech employers across Canada. Designed for both readability (README) and interactivity (Map).
 
@@ -31,11 +31,13 @@ A crowd-sourced repository of tech employers across Canada. Designed for both re
 | --- | --- | --- | --- | --- |
 """
 
-    for c in companies:
-        location = f"{c['city']}, {c['province']}"
-        markdown_content += f"| [{c['name']}]({c['url']}) | {c['industry']} | {location} | {c['remote_policy']} | {c['description']} |\n"
+    # Build the table rows in a list and join once (avoids quadratic += copies)
+    rows = [
+        f"| [{c['name']}]({c['url']}) | {c['industry']} | {c['city']}, {c['province']} | {c['remote_policy']} | {c['description']} |\n"
+        for c in companies
+    ]
 
-    markdown_content += """
+    footer = """
 ## 📝 How to Contribute
 
 ### Prerequisites
@@ -98,6 +100,8 @@ When adding companies to `data/incoming.csv`, use the following format:
 - **lng**: Automatically geocoded from city/province
 """
 
+    markdown_content = header + ''.join(rows) + footer
+
     with open(readme_path, 'w', encoding='utf-8') as f:
         f.write(markdown_content)
     
@@ -105,19 +109,26 @@ When adding companies to `data/incoming.csv`, use the following format:
     docs_csv_path = os.path.join('docs', 'companies.csv')
     try:
         import shutil
-        shutil.copy2(csv_path, docs_csv_path)
+        shutil.copyfile(csv_path, docs_csv_path)
         print(f"Synced {csv_path} to {docs_csv_path}")
         
-        # Sync favicons from public to docs
+        # Sync favicons from public to docs (file metadata isn't needed for Pages,
+        # so copyfile is enough; files already newer in docs are skipped)
         public_dir = 'public'
         docs_dir = 'docs'
         if os.path.exists(public_dir):
-            for filename in os.listdir(public_dir):
-                if filename.endswith(('.png', '.ico', '.svg', '.webmanifest', '.xml')):
-                    src = os.path.join(public_dir, filename)
-                    dst = os.path.join(docs_dir, filename)
-                    shutil.copy2(src, dst)
-                    print(f"Synced {filename} to {docs_dir}")
+            with os.scandir(public_dir) as entries:
+                for entry in entries:
+                    if not (entry.is_file() and entry.name.endswith(('.png', '.ico', '.svg', '.webmanifest', '.xml'))):
+                        continue
+                    dst = os.path.join(docs_dir, entry.name)
+                    try:
+                        if os.stat(dst).st_mtime >= entry.stat().st_mtime:
+                            continue
+                    except FileNotFoundError:
+                        pass
+                    shutil.copyfile(entry.path, dst)
+                    print(f"Synced {entry.name} to {docs_dir}")
     except Exception as e:
         print(f"Error syncing files: {e}")
 